@@ -1,11 +1,14 @@
 import logging
+import collections
+import itertools
 import threading
 import time
 import queue
 import builtins
 import os
 import random
-from datetime import datetime
+from io import BytesIO
+from pathlib import Path
 from flask import Flask, jsonify, request, send_from_directory
 
 # 导入业务逻辑
@@ -13,6 +16,17 @@ import main
 import browser
 import email_service
 from config import cfg
+from utils import parse_account_line, accounts_file_generation
+
+# 尝试导入 Pillow，用于将截图转码为 JPEG（体积远小于 PNG）
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+JPEG_QUALITY = 70
+LONG_POLL_TIMEOUT = 15  # /api/status 长轮询最长等待时间（秒），会占用 waitress 线程，见 serve() 处说明
 
 app = Flask(__name__, static_url_path='')
 
@@ -25,6 +39,32 @@ def resolve_accounts_file_path() -> str:
         return path
     return os.path.join(os.path.dirname(__file__), path)
 
+# 库存数缓存: 文件 (mtime_ns, size) 与写入代数未变化时不重新计数
+_inventory_cache = (None, 0)
+
+def count_inventory() -> int:
+    global _inventory_cache
+    accounts_path = resolve_accounts_file_path()
+    try:
+        st = os.stat(accounts_path)
+    except OSError:
+        return 0
+
+    key = (accounts_path, st.st_mtime_ns, st.st_size, accounts_file_generation())
+    cached_key, cached_count = _inventory_cache
+    if cached_key == key:
+        return cached_count
+
+    try:
+        with open(accounts_path, 'r', encoding='utf-8', errors='replace') as f:
+            count = sum(1 for line in f if '@' in line)
+    except OSError:
+        return cached_count
+
+    # 整体替换元组，避免并发请求读到不一致的 key/count
+    _inventory_cache = (key, count)
+    return count
+
 # ==========================================
 # 🔧 状态管理与日志捕获
 # ==========================================
@@ -33,39 +73,129 @@ def resolve_accounts_file_path() -> str:
 # 🔧 状态管理与日志捕获
 # ==========================================
 
+# 日志时间戳缓存: 同一秒内的日志复用已格式化的字符串
+_log_time_cache = (None, "")
+
+def format_log_time(ts):
+    global _log_time_cache
+    second = int(ts)
+    cached_second, cached_str = _log_time_cache
+    if cached_second != second:
+        cached_str = time.strftime("%H:%M:%S", time.localtime(second))
+        _log_time_cache = (second, cached_str)
+    return cached_str
+
 # 全局状态
 class AppState:
     def __init__(self):
         self.is_running = False
-        self.stop_requested = False
+        self.stop_event = threading.Event()
         self.success_count = 0
         self.fail_count = 0
+        self.stats_lock = threading.Lock()
         self.current_action = "等待启动"
-        self.logs = []
+        self.logs = collections.deque(maxlen=1000)
+        self._log_base = 0  # 已被挤出缓冲区的日志条数，用于换算前端的绝对索引
         self.lock = threading.Lock()
+
+        # 状态变更版本号，供 /api/status 长轮询等待
+        self.change_version = 0
+        self.change_cond = threading.Condition()
+
+        # 日志生产者只负责入队，由单一后台线程格式化并写入缓冲区
+        self._log_queue = queue.SimpleQueue()
+        threading.Thread(target=self._log_consumer, daemon=True).start()
         
-        # MJPEG 流缓冲区
-        self.last_frame = None 
-        self.frame_lock = threading.Lock()
+        # MJPEG 流缓冲区: 单槽 (帧序号, 画面, Content-Type)，整体替换保证读取原子性
+        self.frame_slot = (0, None, "image/png")
+        self.frame_cond = threading.Condition()
 
     def add_log(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        with self.lock:
-            self.logs.append(f"[{timestamp}] {message}")
-            if len(self.logs) > 1000:
-                self.logs.pop(0)
+        self._log_queue.put((time.time(), message))
 
-    def get_logs(self, start_index=0):
+    def _log_consumer(self):
+        while True:
+            batch = [self._log_queue.get()]
+            try:
+                while True:
+                    batch.append(self._log_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            lines = [f"[{format_log_time(ts)}] {message}" for ts, message in batch]
+            with self.lock:
+                for line in lines:
+                    if len(self.logs) == self.logs.maxlen:
+                        self._log_base += 1
+                    self.logs.append(line)
+            self.notify_change()
+
+    def notify_change(self):
+        with self.change_cond:
+            self.change_version += 1
+            self.change_cond.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        """阻塞直到状态版本号不同于 version 或超时，返回当前版本号"""
+        with self.change_cond:
+            self.change_cond.wait_for(lambda: self.change_version != version, timeout=timeout)
+            return self.change_version
+
+    def reset_counters(self):
+        with self.stats_lock:
+            self.success_count = 0
+            self.fail_count = 0
+        self.notify_change()
+
+    def record_result(self, success):
+        with self.stats_lock:
+            if success:
+                self.success_count += 1
+            else:
+                self.fail_count += 1
+        self.notify_change()
+
+    def get_counters(self):
+        """返回一致的 (成功数, 失败数) 快照"""
+        with self.stats_lock:
+            return self.success_count, self.fail_count
+
+    def read_logs(self, start_index=0):
+        """返回 (新日志列表, 下一次拉取应使用的绝对索引)"""
         with self.lock:
-            return list(self.logs[start_index:])
+            offset = max(0, start_index - self._log_base)
+            logs = list(itertools.islice(self.logs, offset, None))
+            return logs, self._log_base + len(self.logs)
             
-    def update_frame(self, frame_bytes):
-        with self.frame_lock:
-            self.last_frame = frame_bytes
-            
-    def get_frame(self):
-        with self.frame_lock:
-            return self.last_frame
+    def update_frame(self, frame_bytes, content_type="image/png"):
+        # 写入方可能不止一个，序号递增与换槽需在锁内完成；读取方仍可无锁读取整个元组
+        with self.frame_cond:
+            seq = self.frame_slot[0] + 1
+            self.frame_slot = (seq, frame_bytes, content_type)
+            self.frame_cond.notify_all()
+
+    def wait_frame(self, last_seq, timeout=None):
+        """阻塞直到出现比 last_seq 更新的画面，返回 (帧序号, 画面, Content-Type)"""
+        with self.frame_cond:
+            self.frame_cond.wait_for(lambda: self.frame_slot[0] != last_seq, timeout=timeout)
+        return self.frame_slot
+
+def encode_frame(png_bytes):
+    """
+    将 PNG 截图转码为 JPEG，Pillow 不可用或转码失败时原样返回 PNG
+
+    返回:
+        tuple: (画面字节, Content-Type)
+    """
+    if not PIL_AVAILABLE:
+        return png_bytes, "image/png"
+    try:
+        with Image.open(BytesIO(png_bytes)) as img:
+            buf = BytesIO()
+            img.convert("RGB").save(buf, format="JPEG", quality=JPEG_QUALITY)
+            return buf.getvalue(), "image/jpeg"
+    except Exception:
+        return png_bytes, "image/png"
 
 state = AppState()
 
@@ -82,88 +212,130 @@ main.print = hooked_print
 browser.print = hooked_print
 email_service.print = hooked_print
 
+# ==========================================
+# 📸 后台截图线程
+# ==========================================
+class ScreenshotProducer:
+    """
+    独立线程负责截图与转码，写入 state 的单槽画面，
+    注册流程只需通知"现在值得截一张"，无需等待截图往返。
+
+    注意: 截图与注册流程共用同一个 WebDriver（chromedriver 会串行处理命令），
+    因此只在 capture() 通知的关键步骤截图，不做周期性轮询。
+    """
+    def __init__(self):
+        self._pending = None  # 待截图的浏览器，仅保留最新一次请求
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def capture(self, driver):
+        """请求对当前浏览器截一张图"""
+        self._pending = driver
+        self._wakeup.set()
+
+    def release(self):
+        """注册结束（浏览器已关闭）后解绑，丢弃尚未处理的截图请求"""
+        self._pending = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            driver, self._pending = self._pending, None
+            if driver is None or self._stopped.is_set():
+                continue
+            try:
+                png_bytes = driver.get_screenshot_as_png()
+            except Exception as e:
+                main.print(f"⚠️ 截图流更新失败: {e}")
+                continue
+            state.update_frame(*encode_frame(png_bytes))
+
 # ==========================================
 # 🧵 后台工作线程
 # ==========================================
 def worker_thread(count):
     state.is_running = True
-    state.stop_requested = False
-    state.success_count = 0
-    state.fail_count = 0
+    state.stop_event.clear()
+    state.reset_counters()
     state.current_action = f"🚀 任务启动，目标: {count}"
+    state.notify_change()
     
     # 清空上一轮的画面，避免显示残留
     state.update_frame(None)
     
     main.print(f"🚀 开始批量任务，计划注册: {count} 个")
+
+    screenshots = ScreenshotProducer()
+    screenshots.start()
     
     try:
         def monitor(driver, step):
             # 1. 检查是否请求停止
-            if state.stop_requested:
+            if state.stop_event.is_set():
                 main.print("🛑 检测到停止请求，正在中断任务...")
                 raise InterruptedError("用户请求停止")
             
-            # 2. 截图更新流 (MJPEG)
-            try:
-                # 获取 PNG 字节流 (内存操作，极快)
-                png_bytes = driver.get_screenshot_as_png()
-                state.update_frame(png_bytes)
-            except Exception as e:
-                main.print(f"⚠️ 截图流更新失败: {e}")
+            # 2. 通知后台线程截图更新流 (MJPEG)，不阻塞注册流程
+            screenshots.capture(driver)
 
         for i in range(count):
-            if state.stop_requested:
+            if state.stop_event.is_set():
                 main.print("🛑 用户停止了任务")
                 break
             
             state.current_action = f"正在注册 ({i+1}/{count})..."
+            state.notify_change()
             
             try:
                 # 调用核心逻辑，传入回调
-                email, password, success = main.register_one_account(monitor_callback=monitor)
+                try:
+                    email, password, success = main.register_one_account(monitor_callback=monitor)
+                finally:
+                    screenshots.release()
                 
-                if success:
-                    state.success_count += 1
-                else:
-                    state.fail_count += 1
+                state.record_result(success)
             except InterruptedError:
                 main.print("🛑 任务已中断")
                 break
             except Exception as e:
-                state.fail_count += 1
+                state.record_result(False)
                 main.print(f"❌ 异常: {str(e)}")
             
             # 间隔等待
-            if i < count - 1 and not state.stop_requested:
+            if i < count - 1 and not state.stop_event.is_set():
                 wait_time = random.randint(cfg.batch.interval_min, cfg.batch.interval_max)
                 main.print(f"⏳ 冷却中，等待 {wait_time} 秒...")
-                for _ in range(wait_time):
-                    if state.stop_requested: break
-                    time.sleep(1)
+                state.stop_event.wait(timeout=wait_time)
                     
     except Exception as e:
         main.print(f"💥 严重错误: {e}")
     finally:
+        screenshots.stop()
         state.is_running = False
         state.current_action = "任务已完成"
+        state.notify_change()
         main.print("🏁 任务结束")
 
 # ==========================================
 # 🌊 MJPEG 流生成器
 # ==========================================
 def gen_frames():
-    """生成流数据的生成器"""
+    """生成流数据的生成器，有新画面时才推送"""
+    last_seq = -1
     while True:
-        frame = state.get_frame()
+        # 超时后重发当前帧，保持连接活跃
+        last_seq, frame, content_type = state.wait_frame(last_seq, timeout=10)
         if frame:
             yield (b'--frame\r\n'
-                   b'Content-Type: image/png\r\n\r\n' + frame + b'\r\n')
-        else:
-            # 如果没有画面（例如刚启动），可以发送一个空帧或者只是等待
-            pass
-            
-        time.sleep(0.5) # 控制刷新率，避免浏览器过于频繁请求
+                   b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + frame + b'\r\n')
 
 @app.route('/video_feed')
 def video_feed():
@@ -180,23 +352,27 @@ def index():
 
 @app.route('/api/status')
 def get_status():
+    # 长轮询：客户端带上上次的版本号，状态无变化时挂起等待
+    client_version = request.args.get('version', type=int)
+    if request.args.get('wait') and client_version is not None:
+        state.wait_for_change(client_version, timeout=LONG_POLL_TIMEOUT)
+    version = state.change_version
+
     # 获取库存数
-    total_inventory = 0
-    accounts_path = resolve_accounts_file_path()
-    if os.path.exists(accounts_path):
-        try:
-            with open(accounts_path, 'r', encoding='utf-8', errors='replace') as f:
-                total_inventory = sum(1 for line in f if '@' in line)
-        except:
-            pass
+    total_inventory = count_inventory()
+
+    success_count, fail_count = state.get_counters()
+    logs, next_log_index = state.read_logs(int(request.args.get('log_index', 0)))
 
     return jsonify({
         "is_running": state.is_running,
         "current_action": state.current_action,
-        "success": state.success_count,
-        "fail": state.fail_count,
+        "success": success_count,
+        "fail": fail_count,
         "total_inventory": total_inventory,
-        "logs": state.get_logs(int(request.args.get('log_index', 0)))
+        "logs": logs,
+        "next_log_index": next_log_index,
+        "version": version
     })
 
 @app.route('/api/start', methods=['POST'])
@@ -215,77 +391,57 @@ def stop_task():
     if not state.is_running:
         return jsonify({"error": "Not running"}), 400
     
-    state.stop_requested = True
+    state.stop_event.set()
     return jsonify({"status": "stopping"})
 
+# /api/accounts 响应缓存: (文件 key, 序列化后的 JSON)
+_accounts_cache = (None, "")
+
 @app.route('/api/accounts')
 def get_accounts():
-    def normalize_time_str(value: str) -> str:
-        value = (value or "").strip()
-        if not value:
-            return ""
-        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S"):
-            try:
-                return datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                pass
-        try:
-            return datetime.strptime(value, "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            return value
-
-    def parse_account_line(line: str) -> dict | None:
-        raw = (line or "").strip()
-        if not raw or raw.startswith("#"):
-            return None
-
-        if "|" in raw:
-            parts = [p.strip() for p in raw.split("|", maxsplit=3)]
-            if len(parts) < 2:
-                return None
-            email = parts[0]
-            if "@" not in email:
-                return None
-            return {
-                "email": email,
-                "password": parts[1],
-                "status": parts[2] if len(parts) > 2 else "",
-                "time": normalize_time_str(parts[3] if len(parts) > 3 else ""),
-            }
-
-        if "----" in raw:
-            parts = [p.strip() for p in raw.split("----", maxsplit=3)]
-            if len(parts) < 2:
-                return None
-            email = parts[0]
-            if "@" not in email:
-                return None
-            return {
-                "email": email,
-                "password": parts[1],
-                "status": parts[3] if len(parts) > 3 else "",
-                "time": normalize_time_str(parts[2] if len(parts) > 2 else ""),
-            }
-
-        return None
-
-    accounts = []
+    global _accounts_cache
+
     accounts_path = resolve_accounts_file_path()
-    if os.path.exists(accounts_path):
+    try:
+        st = os.stat(accounts_path)
+    except OSError:
+        return jsonify([])
+
+    # 文件未变化时直接复用上次序列化好的 JSON
+    # 同尺寸的原地改写在 mtime 精度不足时可能不改变 (mtime_ns, size)，因此带上写入代数
+    generation = accounts_file_generation()
+    key = (accounts_path, st.st_mtime_ns, st.st_size, generation)
+    etag = f"{st.st_mtime_ns:x}-{st.st_size:x}-{generation:x}"
+    cached_key, body = _accounts_cache
+    if cached_key != key:
+        accounts = []
         try:
-            with open(accounts_path, 'r', encoding='utf-8', errors='replace') as f:
-                for line in f:
-                    parsed = parse_account_line(line)
-                    if parsed:
-                        accounts.append(parsed)
+            # 倒序遍历，最新的账号排在最前
+            for raw_line in reversed(Path(accounts_path).read_bytes().splitlines()):
+                # 不含 @ 的行不可能是账号，解码前直接跳过
+                if b'@' not in raw_line:
+                    continue
+                parsed = parse_account_line(raw_line.decode('utf-8', errors='replace'))
+                if parsed:
+                    accounts.append(parsed)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
-    # 反转列表，最新的在前
-    return jsonify(accounts[::-1])
+        body = app.json.dumps(accounts)
+        _accounts_cache = (key, body)
+
+    # 带 ETag 返回，客户端携带 If-None-Match 且未变化时返回 304
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 if __name__ == '__main__':
     from waitress import serve
     print("🌐 Web Server started at http://localhost:5001")
     # 使用生产级服务器 Waitress
-    # threads=6 支持并发：前端页面 + API轮询 + MJPEG流 + 后台任务
-    serve(app, host='0.0.0.0', port=5001, threads=6)
+    # 线程数上限说明：每个打开的前端页面会长期占用 2 个线程
+    #   - /video_feed MJPEG 流（连接期间一直占用）
+    #   - /api/status 长轮询（每次最多挂起 LONG_POLL_TIMEOUT 秒）
+    # threads=16 可支持约 6 个同时打开的页面，并为 /api/start、/api/stop、
+    # /api/accounts 等短请求保留余量；页面更多时需相应调大，否则短请求会排队等待
+    serve(app, host='0.0.0.0', port=5001, threads=16)
@@ -1,6 +1,6 @@
 let isRunning = false;
 let logIndex = 0;
-let pollInterval = null;
+let statusVersion = null;
 
 // 初始化
 document.addEventListener('DOMContentLoaded', () => {
@@ -24,20 +24,39 @@ function switchTab(tabName) {
     }
 }
 
-// 轮询状态
+// 轮询状态（长轮询：带上版本号，后端在状态变化时才返回）
 function startPolling() {
-    pollStatus(); // 立即执行一次
-    pollInterval = setInterval(pollStatus, 1000);
+    pollLoop();
+}
+
+async function pollLoop() {
+    while (true) {
+        const waited = await pollStatus();
+        if (!waited) {
+            // 首次请求、出错或后端不支持长轮询时退回 1 秒间隔
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
 }
 
 async function pollStatus() {
+    const waiting = statusVersion !== null;
+    let url = `/api/status?log_index=${logIndex}`;
+    if (waiting) {
+        url += `&wait=1&version=${statusVersion}`;
+    }
+
     try {
-        const res = await fetch(`/api/status?log_index=${logIndex}`);
+        const res = await fetch(url);
         const data = await res.json();
 
+        statusVersion = typeof data.version === 'number' ? data.version : null;
         updateUI(data);
+        return waiting;
     } catch (e) {
         console.error("Polling error:", e);
+        statusVersion = null;
+        return false;
     }
 }
 
@@ -114,6 +133,11 @@ function updateUI(data) {
         // 更新索引，避免重复拉取
         logIndex += data.logs.length;
     }
+
+    // 后端缓冲区有上限，以后端返回的绝对索引为准
+    if (typeof data.next_log_index === 'number') {
+        logIndex = data.next_log_index;
+    }
 }
 
 // 启动任务
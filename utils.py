@@ -9,6 +9,7 @@ import csv
 import os
 import re
 import time
+import threading
 from pathlib import Path
 from datetime import datetime
 import requests
@@ -33,6 +34,8 @@ try:
     from faker import Faker
     # 创建多语言环境的 Faker 实例（英语为主，增加真实感）
     fake = Faker(['en_US', 'en_GB'])
+    # 美国地址专用实例（构造开销大，全局复用）
+    fake_us = Faker('en_US')
     # 设置随机种子以确保可重复性（可选）
     # Faker.seed(0)
     FAKER_AVAILABLE = True
@@ -103,6 +106,15 @@ def get_user_agent():
     return USER_AGENT
 
 
+# 密码必须包含的字符类别：大写字母、小写字母、数字、特殊字符
+_PASSWORD_CLASS_POOLS = (
+    string.ascii_uppercase,
+    string.ascii_lowercase,
+    string.digits,
+    "!@#$%",
+)
+
+
 def generate_random_password(length=None):
     """
     生成随机密码
@@ -117,144 +129,238 @@ def generate_random_password(length=None):
     if length is None:
         length = PASSWORD_LENGTH
     
-    # 先随机生成指定长度的密码
-    password = ''.join(random.choice(PASSWORD_CHARS) for _ in range(length))
-    
-    # 确保包含各类字符（替换前4位）
-    password = (
-        random.choice(string.ascii_uppercase) +   # 大写字母
-        random.choice(string.ascii_lowercase) +   # 小写字母
-        random.choice(string.digits) +            # 数字
-        random.choice("!@#$%") +                  # 特殊字符
-        password[4:]                              # 剩余部分
+    # 前 4 位确保包含各类字符，剩余部分从配置的字符集中批量抽取
+    password = ''.join(
+        [random.choice(pool) for pool in _PASSWORD_CLASS_POOLS] +
+        random.choices(PASSWORD_CHARS, k=max(length - 4, 0))
     )
     
     print(f"✅ 已生成密码: {password}")
     return password
 
 
+# 账号文件解析: 预编译分隔符与标准时间格式
+_PIPE_SPLIT = re.compile(r'\s*\|\s*')
+_DASH_SPLIT = re.compile(r'\s*----\s*')
+# 三种时间格式，整串只能符合其中一种:
+# 2026-01-06 09:45:00 / 2026/01/06 09:45:00（月日时分秒可为 1 位），旧格式 20260206_015747
+_TIME_RE = re.compile(
+    r'(\d{4})([-/])(\d{1,2})\2(\d{1,2}) (\d{1,2}):(\d{1,2}):(\d{1,2})'
+    r'|(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2})'
+)
+# 已是标准格式的账号行（邮箱 | 密码 | 状态 | 时间），整理文件时可原样保留
+_CANONICAL_LINE_RE = re.compile(
+    r'(?!#)([^\s|](?:[^|]*[^\s|])?) \| ([^\s|](?:[^|]*[^\s|])?) \| ((?:[^\s|](?:[^|]*[^\s|])?)?) \| '
+    r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})?\n'
+)
+
+
+# 账号文件索引: {邮箱: (行字节偏移, 行字节长度, 密码)}
+# 保存时原地覆盖或追加写入，避免每次都整体重写文件
+_accounts_lock = threading.Lock()
+_accounts_index: dict[str, tuple[int, int, str]] = {}
+_accounts_index_key = None  # (路径, mtime_ns, size)，文件被外部修改时重建索引
+# 本进程每次写账号文件都递增，供缓存在 mtime 精度不足时识别同尺寸的改写
+_accounts_generation = 0
+# 追加写入后原行被覆盖成的占位注释，整理文件时只清理这种行
+_SUPERSEDED_MARKER = b"#~superseded"
+
+
+def accounts_file_generation() -> int:
+    """返回账号文件在本进程内的写入代数"""
+    return _accounts_generation
+
+
+def _resolve_accounts_file_path() -> Path:
+    path = Path(TXT_FILE)
+    if path.is_absolute():
+        return path
+    return (Path(__file__).resolve().parent / path)
+
+
+def normalize_time_str(value: str) -> str:
+    value = (value or "").strip()
+    if not value:
+        return ""
+    match = _TIME_RE.fullmatch(value)
+    if not match:
+        return value
+    groups = match.groups()
+    fields = (groups[0],) + groups[2:7] if groups[0] else groups[7:]
+    year, month, day, hour, minute, second = map(int, fields)
+    try:
+        # 校验日期时间是否合法（如 13 月、2 月 30 日）
+        datetime(year, month, day, hour, minute, second)
+    except ValueError:
+        return value
+    return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
+
+
+def parse_account_line(line: str) -> dict | None:
+    raw = (line or "").strip()
+    if not raw or raw.startswith("#"):
+        return None
+
+    # 新格式：邮箱 | 密码 | 状态 | 时间
+    if "|" in raw:
+        parts = _PIPE_SPLIT.split(raw, maxsplit=3)
+        if len(parts) < 2:
+            return None
+        parsed_email = parts[0]
+        if "@" not in parsed_email:
+            return None
+        parsed_password = parts[1] or "N/A"
+        parsed_status = parts[2] if len(parts) > 2 else ""
+        parsed_time = normalize_time_str(parts[3] if len(parts) > 3 else "")
+        return {
+            "email": parsed_email,
+            "password": parsed_password,
+            "status": parsed_status,
+            "time": parsed_time,
+        }
+
+    # 旧格式：邮箱----密码----时间----状态
+    if "----" in raw:
+        parts = _DASH_SPLIT.split(raw, maxsplit=3)
+        if len(parts) < 2:
+            return None
+        parsed_email = parts[0]
+        if "@" not in parsed_email:
+            return None
+        parsed_password = parts[1] or "N/A"
+        parsed_time = normalize_time_str(parts[2] if len(parts) > 2 else "")
+        parsed_status = parts[3] if len(parts) > 3 else ""
+        return {
+            "email": parsed_email,
+            "password": parsed_password,
+            "status": parsed_status,
+            "time": parsed_time,
+        }
+
+    return None
+
+
+def format_account_line(line_email: str, line_password: str, line_status: str, line_time: str) -> str:
+    safe_password = (line_password or "N/A").strip() or "N/A"
+    safe_status = (line_status or "").strip()
+    safe_time = normalize_time_str(line_time) if line_time else ""
+    return f"{line_email.strip()} | {safe_password} | {safe_status} | {safe_time}\n"
+
+
+def _normalize_account_line(line: str) -> tuple[dict | None, str | None]:
+    """返回 (解析结果, 规范化后的行)，已是标准格式的行跳过解析与重新格式化"""
+    match = _CANONICAL_LINE_RE.fullmatch(line)
+    if match and "@" in match.group(1):
+        return {
+            "email": match.group(1),
+            "password": match.group(2),
+            "status": match.group(3),
+            "time": match.group(4) or "",
+        }, line
+
+    parsed = parse_account_line(line)
+    if not parsed:
+        return None, None
+    return parsed, format_account_line(
+        parsed["email"],
+        parsed["password"],
+        parsed["status"],
+        parsed["time"],
+    )
+
+
+def _file_key(file_path: Path) -> tuple:
+    st = file_path.stat()
+    return (str(file_path), st.st_mtime_ns, st.st_size)
+
+
+def compact_accounts_file(file_path: Path = None):
+    """
+    整理账号文件并重建索引：
+    规范化所有账号行，清理追加写入后留下的占位注释；
+    同一邮箱有多行时全部保留，索引指向最后一行
+    """
+    global _accounts_index_key, _accounts_generation
+
+    if file_path is None:
+        file_path = _resolve_accounts_file_path()
+
+    lines: list[str] = []
+    if file_path.exists():
+        with file_path.open("r", encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+
+    marker = _SUPERSEDED_MARKER.decode()
+    normalized: list[tuple[dict | None, str]] = []
+    for line in lines:
+        parsed, formatted = _normalize_account_line(line)
+        if parsed:
+            normalized.append((parsed, formatted))
+            continue
+
+        if line.strip() == marker:
+            continue
+        normalized.append((None, line if line.endswith("\n") else line + "\n"))
+
+    _accounts_index.clear()
+    offset = 0
+    tmp_path = file_path.with_suffix(file_path.suffix + ".tmp")
+    with tmp_path.open("wb") as f:
+        for parsed, line in normalized:
+            data = line.encode("utf-8")
+            if parsed:
+                # 重复的邮箱由后出现的行覆盖，即索引最后一行
+                _accounts_index[parsed["email"]] = (offset, len(data), parsed["password"])
+            f.write(data)
+            offset += len(data)
+    os.replace(tmp_path, file_path)
+    _accounts_generation += 1
+    _accounts_index_key = _file_key(file_path)
+
+
 def save_to_txt(email: str, password: str = None, status="已注册"):
     """
     保存账号信息到 TXT 文件，格式: 邮箱 | 密码 | 状态 | 注册时间
     如果账号已存在，则更新其信息。
-    """
-    try:
-        def resolve_accounts_file_path() -> Path:
-            path = Path(TXT_FILE)
-            if path.is_absolute():
-                return path
-            return (Path(__file__).resolve().parent / path)
-
-        def normalize_time_str(value: str) -> str:
-            value = (value or "").strip()
-            if not value:
-                return ""
-            # 新格式（推荐）：2026-01-06 09:45:00
-            for fmt in ("%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S"):
-                try:
-                    return datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    pass
-            # 旧格式：20260206_015747
-            try:
-                return datetime.strptime(value, "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                return value
-
-        def parse_account_line(line: str) -> dict | None:
-            raw = (line or "").strip()
-            if not raw or raw.startswith("#"):
-                return None
-
-            # 新格式：邮箱 | 密码 | 状态 | 时间
-            if "|" in raw:
-                parts = [p.strip() for p in raw.split("|", maxsplit=3)]
-                if len(parts) < 2:
-                    return None
-                parsed_email = parts[0]
-                if "@" not in parsed_email:
-                    return None
-                parsed_password = parts[1] or "N/A"
-                parsed_status = parts[2] if len(parts) > 2 else ""
-                parsed_time = normalize_time_str(parts[3] if len(parts) > 3 else "")
-                return {
-                    "email": parsed_email,
-                    "password": parsed_password,
-                    "status": parsed_status,
-                    "time": parsed_time,
-                }
-
-            # 旧格式：邮箱----密码----时间----状态
-            if "----" in raw:
-                parts = [p.strip() for p in raw.split("----", maxsplit=3)]
-                if len(parts) < 2:
-                    return None
-                parsed_email = parts[0]
-                if "@" not in parsed_email:
-                    return None
-                parsed_password = parts[1] or "N/A"
-                parsed_time = normalize_time_str(parts[2] if len(parts) > 2 else "")
-                parsed_status = parts[3] if len(parts) > 3 else ""
-                return {
-                    "email": parsed_email,
-                    "password": parsed_password,
-                    "status": parsed_status,
-                    "time": parsed_time,
-                }
-
-            return None
 
-        def format_account_line(line_email: str, line_password: str, line_status: str, line_time: str) -> str:
-            safe_password = (line_password or "N/A").strip() or "N/A"
-            safe_status = (line_status or "").strip()
-            safe_time = normalize_time_str(line_time) if line_time else ""
-            return f"{line_email.strip()} | {safe_password} | {safe_status} | {safe_time}\n"
+    已存在的账号在新行不超过原行长度时原地覆盖，否则追加新行并将旧行替换为占位注释
+    （此时该账号会移到文件末尾），文件只在首次保存或被外部修改后整理一次。
+    """
+    global _accounts_index_key, _accounts_generation
 
-        file_path = resolve_accounts_file_path()
+    try:
+        file_path = _resolve_accounts_file_path()
         file_path.parent.mkdir(parents=True, exist_ok=True)
         current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 读取现有内容
-        lines: list[str] = []
-        if file_path.exists():
-            with file_path.open("r", encoding="utf-8", errors="replace") as f:
-                lines = f.readlines()
-        
-        # 检查是否已存在，存在则更新
-        found = False
-        new_line_content = format_account_line(email, password or "N/A", status, current_date)
-        
-        normalized_lines: list[str] = []
-        for line in lines:
-            parsed = parse_account_line(line)
-            if not parsed:
-                normalized_lines.append(line)
-                continue
-
-            if parsed["email"] == email:
-                final_password = password or parsed["password"] or "N/A"
-                normalized_lines.append(format_account_line(email, final_password, status, current_date))
-                found = True
-                continue
-
-            normalized_lines.append(
-                format_account_line(
-                    parsed["email"],
-                    parsed["password"],
-                    parsed["status"],
-                    parsed["time"],
-                )
-            )
-        
-        if not found:
-            normalized_lines.append(new_line_content)
-            
-        # 写回文件
-        tmp_path = file_path.with_suffix(file_path.suffix + ".tmp")
-        with tmp_path.open("w", encoding="utf-8") as f:
-            f.writelines(normalized_lines)
-        os.replace(tmp_path, file_path)
-            
+
+        with _accounts_lock:
+            if not file_path.exists() or _accounts_index_key != _file_key(file_path):
+                compact_accounts_file(file_path)
+
+            entry = _accounts_index.get(email)
+            final_password = password or (entry[2] if entry else None) or "N/A"
+            new_line = format_account_line(email, final_password, status, current_date).encode("utf-8")
+
+            with file_path.open("r+b") as f:
+                if entry and len(new_line) <= entry[1]:
+                    # 原地覆盖，多余长度用空格填充（解析时会被 strip 掉）
+                    offset, length, _ = entry
+                    f.seek(offset)
+                    f.write(new_line[:-1].ljust(length - 1) + b"\n")
+                    _accounts_index[email] = (offset, length, final_password)
+                else:
+                    f.seek(0, os.SEEK_END)
+                    offset = f.tell()
+                    f.write(new_line)
+                    if entry:
+                        # 先追加新行再将旧行覆盖为占位注释，中途中断时新记录仍是索引中的最后一行
+                        f.seek(entry[0])
+                        f.write(_SUPERSEDED_MARKER.ljust(entry[1] - 1) + b"\n")
+                    _accounts_index[email] = (offset, len(new_line), final_password)
+
+            _accounts_generation += 1
+            _accounts_index_key = _file_key(file_path)
+
         print(f"💾 账号状态已更新: {status}")
         
     except Exception as e:
@@ -272,6 +378,15 @@ def update_account_status(email: str, new_status: str, password: str = None):
     save_to_txt(email, password, new_status)
 
 
+# 验证码匹配模式（按优先级排列）
+_CODE_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'代码为\s*(\d{6})',           # 中文格式
+    r'code is\s*(\d{6})',          # 英文格式
+    r'verification code[:\s]*(\d{6})',  # 完整英文格式
+    r'(\d{6})',                     # 通用 6 位数字
+))
+
+
 def extract_verification_code(content: str):
     """
     从邮件内容中提取 6 位数字验证码
@@ -285,18 +400,10 @@ def extract_verification_code(content: str):
     if not content:
         return None
     
-    # 验证码匹配模式（按优先级排列）
-    patterns = [
-        r'代码为\s*(\d{6})',           # 中文格式
-        r'code is\s*(\d{6})',          # 英文格式
-        r'verification code[:\s]*(\d{6})',  # 完整英文格式
-        r'(\d{6})',                     # 通用 6 位数字
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, content, re.IGNORECASE)
-        if matches:
-            code = matches[0]
+    for pattern in _CODE_PATTERNS:
+        match = pattern.search(content)
+        if match:
+            code = match.group(1)
             print(f"  ✅ 提取到验证码: {code}")
             return code
     
@@ -347,8 +454,8 @@ def generate_random_birthday():
         # 使用 Faker 生成符合年龄范围的生日
         birthday = fake.date_of_birth(minimum_age=MIN_AGE, maximum_age=MAX_AGE)
         year_str = str(birthday.year)
-        month_str = str(birthday.month).zfill(2)
-        day_str = str(birthday.day).zfill(2)
+        month_str = f"{birthday.month:02d}"
+        day_str = f"{birthday.day:02d}"
     else:
         # 回退到原始逻辑
         from datetime import datetime as dt
@@ -372,8 +479,8 @@ def generate_random_birthday():
         birth_day = random.randint(1, max_day)
         
         year_str = str(birth_year)
-        month_str = str(birth_month).zfill(2)
-        day_str = str(birth_day).zfill(2)
+        month_str = f"{birth_month:02d}"
+        day_str = f"{birth_day:02d}"
     
     print(f"✅ 已生成随机生日: {year_str}/{month_str}/{day_str}")
     return year_str, month_str, day_str
@@ -409,9 +516,6 @@ def generate_japan_address():
     使用 Faker 生成更真实多样的日本地址
     """
     if FAKER_AVAILABLE:
-        # 创建日本本地化的 Faker 实例
-        fake_jp = Faker('ja_JP')
-        
         # 日本主要城市的区域信息
         tokyo_wards = [
             {"ward": "Chiyoda-ku", "zip_prefix": "100"},
@@ -470,9 +574,6 @@ def generate_us_address():
     使用 Faker 生成真实风格的美国地址
     """
     if FAKER_AVAILABLE:
-        # 使用美国 Faker
-        fake_us = Faker('en_US')
-        
         # 常见的免税或低税州（对支付友好）
         states = [
             {"name": "Delaware", "code": "DE", "cities": ["Wilmington", "Dover", "Newark"]},